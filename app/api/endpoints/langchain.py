@@ -1,12 +1,29 @@
 # app/api/endpoints/langchain.py
 
-from fastapi import APIRouter, Depends
+import logging
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
 from app.services.langchain_service import LangChainService
 from app.schemas.memory import MemoryBase
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+def get_langchain_service(request: Request) -> LangChainService:
+    return request.app.state.langchain_service
+
+async def event_stream(chunks):
+    try:
+        async for chunk in chunks:
+            yield "".join(f"data: {line}\n" for line in chunk.split("\n")) + "\n"
+    except Exception:
+        # The 200 status is already sent, so the client is told through the stream instead
+        logger.exception("Failed to stream answer")
+        yield "event: error\ndata: Failed to generate an answer\n\n"
+
 @router.post("/ask/")
-def ask_question(question: MemoryBase, service: LangChainService = Depends()):
-    response = service.ask_question(question.question)
-    return {"response": response}
\ No newline at end of file
+async def ask_question(question: MemoryBase, service: LangChainService = Depends(get_langchain_service)):
+    # Tokens are sent as they are generated, the memory is saved once the answer completes
+    return StreamingResponse(event_stream(service.stream_question(question.question)), media_type="text/event-stream")
\ No newline at end of file
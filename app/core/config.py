@@ -6,6 +6,20 @@ class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./test.db"
     API_V1_STR: str = "/api/v1"
     OPENAI_API_KEY: str
+    OPENAI_MODEL: str = "gpt-4o-mini"
+    HTTP_MAX_CONNECTIONS: int = 1000
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 200
+    HTTP_TIMEOUT: float = 60
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BATCH_WAIT: float = 0.01
+    EXACT_CACHE_SIZE: int = 10_000
+    SEMANTIC_CACHE_THRESHOLD: float = 0.85
+    SEMANTIC_CACHE_SIZE: int = 10_000
+    MEMORY_TOP_K: int = 5
+    MEMORY_INDEX_SIZE: int = 20_000
+    MEMORY_MAX_TOKENS: int = 512
+    FAISS_THREADS: int = 1
 
     model_config = SettingsConfigDict(env_file='.env', env_file_encoding='utf-8')
 
@@ -1,12 +1,35 @@
 # app/main.py
 
+from contextlib import asynccontextmanager
+
+import faiss
+import httpx
 from fastapi import FastAPI
 from app.core.config import settings
 from app.api.endpoints import langchain
-from app.utils.database import Base, engine
+from app.services.langchain_service import LangChainService
+from app.utils.database import create_tables, engine
 
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_tables()
+    # Every worker rebuilds its own index, so each one sticks to its share of the CPUs
+    faiss.omp_set_num_threads(settings.FAISS_THREADS)
+    # One service per worker so the chains and the OpenAI connection pool are reused
+    async with httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        http2=True,
+        timeout=settings.HTTP_TIMEOUT
+    ) as http_client:
+        app.state.langchain_service = LangChainService(http_client=http_client)
+        await app.state.langchain_service.start()
+        yield
+        await app.state.langchain_service.drain()
+    await engine.dispose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(langchain.router, prefix=settings.API_V1_STR)
\ No newline at end of file
@@ -1,6 +1,6 @@
 # app/models/memory.py
 
-from sqlalchemy import Column, Integer, String, Text, Boolean
+from sqlalchemy import Column, Integer, String, Text, Boolean, LargeBinary, Index
 from app.utils.database import Base
 
 class Memory(Base):
@@ -9,4 +9,8 @@ class Memory(Base):
     id = Column(Integer, primary_key=True, index=True)
     question = Column(String, index=True)
     response = Column(Text)
-    long_term = Column(Boolean, default=False)
\ No newline at end of file
+    long_term = Column(Boolean, default=False)
+    embedding = Column(LargeBinary, nullable=True)
+
+    # Serves "most recent long-term memories", e.g. rebuilding the vector index at startup
+    __table_args__ = (Index("ix_memories_long_term_id", long_term, id.desc()),)
\ No newline at end of file
@@ -1,16 +1,12 @@
 # app/schemas/memory.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class MemoryBase(BaseModel):
     question: str
     response: str
 
-class MemoryCreate(MemoryBase):
-    long_term: bool
-
-class Memory(MemoryBase):
-    id: int
-
-    class Config:
-        orm_mode = True
\ No newline at end of file
+class MemoryDecision(BaseModel):
+    answer: str = Field(description="The AI's reply to the human")
+    should_remember: bool = Field(description="Whether the exchange contains information worth remembering")
+    confirm: bool = Field(description="Whether that information is a valid memory that should be saved")
\ No newline at end of file
@@ -0,0 +1,42 @@
+# app/services/answer_stream.py
+
+import asyncio
+from typing import AsyncIterator
+
+class AnswerStream:
+    def __init__(self, source: AsyncIterator[str]):
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._changed = asyncio.Condition()
+        # Runs on its own so the answer completes even if every reader disconnects
+        self.task = asyncio.create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                async with self._changed:
+                    self._chunks.append(chunk)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            async with self._changed:
+                self._done = True
+                self._changed.notify_all()
+
+    async def __aiter__(self):
+        # Every reader replays the chunks produced so far, then follows along
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: sent < len(self._chunks) or self._done)
+                chunks = self._chunks[sent:]
+                done = self._done
+            for chunk in chunks:
+                yield chunk
+            sent += len(chunks)
+            if done:
+                if self._error is not None:
+                    raise self._error
+                return
\ No newline at end of file
@@ -4,13 +4,9 @@ from abc import ABC, abstractmethod
 
 class BaseService(ABC):
     @abstractmethod
-    def ask_question(self, question: str):
+    async def ask_question(self, question: str):
         pass
 
     @abstractmethod
-    def analyze_response(self, question: str, response: str):
-        pass
-
-    @abstractmethod
-    def confirm_memory(self, analysis: str):
+    async def confirm_memory(self, question: str, decision, vector):
         pass
\ No newline at end of file
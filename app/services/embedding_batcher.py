@@ -0,0 +1,61 @@
+# app/services/embedding_batcher.py
+
+import asyncio
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+class EmbeddingBatcher:
+    def __init__(self, embeddings: Embeddings, max_batch: int = 64, max_wait: float = 0.01):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        self._worker = None
+        self._batches = set()
+
+    async def embed(self, text: str) -> List[float]:
+        # Started lazily so the worker runs on the loop that serves requests
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Collect whatever else arrives within max_wait into the same request
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Don't hold the next batch back while this one is in flight
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _embed_batch(self, batch):
+        try:
+            vectors = await self.embeddings.aembed_documents([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    async def close(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        self._worker = None
+        await asyncio.gather(*self._batches, return_exceptions=True)
\ No newline at end of file
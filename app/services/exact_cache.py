@@ -0,0 +1,24 @@
+# app/services/exact_cache.py
+
+from collections import OrderedDict
+from typing import Optional
+
+class ExactCache:
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._responses = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        response = self._responses.get(key)
+        if response is not None:
+            self._responses.move_to_end(key)
+        return response
+
+    def put(self, key: str, response: str):
+        self._responses[key] = response
+        self._responses.move_to_end(key)
+        if len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+    def clear(self):
+        self._responses.clear()
\ No newline at end of file
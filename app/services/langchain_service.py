@@ -1,22 +1,33 @@
-from langchain_community.memory.kg import ConversationKGMemory
-from langchain_openai import OpenAI
-from langchain.chains.conversation.base import ConversationChain
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_core.messages import BaseMessage
+import asyncio
+import hashlib
+from typing import Optional
+
+import httpx
+import tiktoken
+from sqlalchemy import insert
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from langchain_core.output_parsers.openai_tools import JsonOutputKeyToolsParser
 
 from app.models.memory import Memory
-from app.utils.database import SessionLocal
+from app.schemas.memory import MemoryDecision
+from app.utils.database import AsyncSessionLocal
+from app.services.answer_stream import AnswerStream
 from app.services.base_service import BaseService
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.exact_cache import ExactCache
+from app.services.memory import LongTermMemory
+from app.services.memory_writer import MemoryWriter
+from app.services.semantic_cache import SemanticCache
+from app.utils.vector_index import normalize
 from app.core.config import settings
 
-class LangChainService(BaseService):
-    def __init__(self):
-        llm = OpenAI(temperature=0, api_key=settings.OPENAI_API_KEY)
-        self.memory = ConversationKGMemory(llm=llm, memory_key="history", input_key="input")
-        
-        agent1_prompt_template = """The following is a friendly conversation between a human and an AI. The AI is talkative and provides lots of specific details from its context. 
+# Static instructions first and the per-request parts last so the prompt prefix is cacheable.
+# A plain str.format template, formatted directly instead of through a PromptTemplate.
+AGENT_PROMPT = """The following is a friendly conversation between a human and an AI. The AI is talkative and provides lots of specific details from its context. 
         If the AI does not know the answer to a question, it truthfully says it does not know. The AI ONLY uses information contained in the "Relevant Information" section and does not hallucinate.
 
+        Answer the human, then analyze the exchange for potential memory and confirm if the memory should be saved.
+
         Relevant Information:
 
         {history}
@@ -26,88 +37,168 @@ class LangChainService(BaseService):
         AI:
         """
 
-        self.agent1 = ConversationChain(
-            llm=llm,
-            prompt=PromptTemplate(input_variables=["history", "input"], template=agent1_prompt_template),
-            memory=self.memory,
-            input_key="input",
-            output_key="response"
+class LangChainService(BaseService):
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self._inflight = {}
+        self._cache_version = 0
+        self.encoding = None
+        self.writer = MemoryWriter(self.save_memories_batch)
+
+        # Chat and embedding calls share one connection pool when a client is given. The
+        # OpenAI client sends its own timeout with every request, overriding the httpx one,
+        # so it has to be set here as well.
+        self.llm = llm = ChatOpenAI(
+            model=settings.OPENAI_MODEL,
+            temperature=0,
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.HTTP_TIMEOUT,
+            http_async_client=http_client
         )
-
-        agent2_prompt_template = """The following is a friendly conversation between a human and an AI. The AI is talkative and provides lots of specific details from its context. 
-        If the AI does not know the answer to a question, it truthfully says it does not know. The AI ONLY uses information contained in the "Relevant Information" section and does not hallucinate.
-
-        Relevant Information:
-
-        {history}
-
-        Analyze the response for potential memory
-
-        Conversation:
-        Human: {input}
-        AI:
-        """
-        
-        self.agent2 = ConversationChain(
-            llm=llm,
-            prompt=PromptTemplate(input_variables=["history", "input"], template=agent2_prompt_template),
-            memory=self.memory,
-            input_key="input",
-            output_key="response"
+        self.embeddings = OpenAIEmbeddings(
+            model=settings.EMBEDDING_MODEL,
+            api_key=settings.OPENAI_API_KEY,
+            timeout=settings.HTTP_TIMEOUT,
+            http_async_client=http_client
         )
-
-        agent3_prompt_template = """The following is a friendly conversation between a human and an AI. The AI is talkative and provides lots of specific details from its context. 
-        If the AI does not know the answer to a question, it truthfully says it does not know. The AI ONLY uses information contained in the "Relevant Information" section and does not hallucinate.
-
-        Relevant Information:
-
-        {history}
-
-        Confirm if the memory should be saved.
-
-        Conversation:
-        Human: {input}
-        AI:
-        """
-        
-        self.agent3 = ConversationChain(
-            llm=llm,
-            prompt=PromptTemplate(input_variables=["history", "input"], template=agent3_prompt_template),
-            memory=self.memory,
-            input_key="input",
-            output_key="response"
+        # Questions from concurrent requests are embedded together in one API call
+        self.batcher = EmbeddingBatcher(
+            self.embeddings,
+            max_batch=settings.EMBEDDING_BATCH_SIZE,
+            max_wait=settings.EMBEDDING_BATCH_WAIT
+        )
+        # Repeats of the same question are answered before any embedding call
+        self.exact_cache = ExactCache(max_entries=settings.EXACT_CACHE_SIZE)
+        self.cache = SemanticCache(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=settings.SEMANTIC_CACHE_SIZE
+        )
+        # Past memories are retrieved by embedding similarity instead of LLM entity extraction
+        self.memory = LongTermMemory(
+            self.embeddings,
+            self.count_tokens,
+            k=settings.MEMORY_TOP_K,
+            max_entries=settings.MEMORY_INDEX_SIZE,
+            max_tokens=settings.MEMORY_MAX_TOKENS
         )
 
-    def ask_question(self, question: str):
-        response = self.agent1.predict(input=question, history=[])
-        analysis = self.analyze_response(question, response)
-        if analysis:
-            self.confirm_memory(analysis, question, response)
-        return response
-
-    def analyze_response(self, question: str, response: str):
-        analysis = self.agent2.predict(input=f"Question: {question}\nResponse: {response}\nShould this be remembered?", history=[])
-        return analysis
+        # A single structured completion answers and decides on the memory in one round-trip.
+        # The tool call arguments are parsed as they stream so the answer can be sent early.
+        self.agent = (
+            llm.bind_tools([MemoryDecision], tool_choice="MemoryDecision")
+            | JsonOutputKeyToolsParser(key_name="MemoryDecision", first_tool_only=True)
+        )
 
-    def confirm_memory(self, analysis: str, question: str, response: str):
-        confirmation = self.agent3.predict(input=f"Analysis: {analysis}\nIs this a valid memory?", history=[])
-        if "yes" in confirmation.lower():
-            self.save_memory(question, response, long_term=True)
+    async def ask_question(self, question: str):
+        return "".join([chunk async for chunk in self.stream_question(question)])
+
+    async def stream_question(self, question: str):
+        key = hashlib.blake2b(question.strip().casefold().encode()).hexdigest()
+        await self.refresh_caches()
+        cached = self.exact_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        stream = self._inflight.get(key)
+        if stream is None:
+            stream = AnswerStream(self._answer(question, key))
+            self._inflight[key] = stream
+            stream.task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        async for chunk in stream:
+            yield chunk
+
+    async def refresh_caches(self):
+        # Cached answers were given without the memories saved since, by this worker or
+        # any other, so both caches start over once new memories are indexed
+        await self.memory.refresh()
+        if self.memory.version != self._cache_version:
+            self._cache_version = self.memory.version
+            self.exact_cache.clear()
+            self.cache.clear()
+
+    async def _answer(self, question: str, key: str):
+        version = self.memory.version
+        vector = await self.embed(question)
+        cached = await self.cache.lookup(vector)
+        if cached is not None:
+            if self.memory.version == version:
+                self.exact_cache.put(key, cached)
+            yield cached
+            return
+        history = await self.memory.load(vector)
+        arguments = {}
+        answer = ""
+        async for parsed in self.agent.astream(AGENT_PROMPT.format(history=history, input=question)):
+            # A chunk ending mid-escape can parse to less than the previous one, so the
+            # answer only ever grows
+            arguments = parsed or {}
+            partial = arguments.get("answer") or ""
+            if len(partial) > len(answer):
+                yield partial[len(answer):]
+                answer = partial
+        should_remember, confirm = arguments.get("should_remember"), arguments.get("confirm")
+        # The flags come after the answer, so both parsing means the tool call completed.
+        # A truncated one was still streamed to the client but is neither cached nor remembered.
+        if not answer or not isinstance(should_remember, bool) or not isinstance(confirm, bool):
+            return
+        decision = MemoryDecision(answer=answer, should_remember=should_remember, confirm=confirm)
+        # An answer that raced with new memories may not reflect them, so it isn't cached
+        if self.memory.version == version:
+            self.exact_cache.put(key, decision.answer)
+            self.cache.add(vector, decision.answer)
+        await self.confirm_memory(question, decision, vector)
+
+    async def embed(self, text: str):
+        return normalize(await self.batcher.embed(text))
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    async def start(self):
+        # Loading an encoding may download it, so both happen once here and never inside a
+        # request. OpenAIEmbeddings tokenizes every batch and finds its encoding in tiktoken's
+        # process-wide cache once it has been loaded.
+        self.encoding, _ = await asyncio.gather(
+            asyncio.to_thread(self._load_encoding, settings.OPENAI_MODEL, "o200k_base"),
+            asyncio.to_thread(self._load_encoding, settings.EMBEDDING_MODEL, "cl100k_base"),
+        )
+        await self.memory.build()
 
-    def save_memory(self, question: str, response: str, long_term: bool):
-        db = SessionLocal()
+    @staticmethod
+    def _load_encoding(model: str, fallback: str):
         try:
-            memory = Memory(question=question, response=response, long_term=long_term)
-            db.add(memory)
-            db.commit()
-            db.refresh(memory)
-            return memory
-        except Exception as e:
-            db.rollback()
-            raise e
-        finally:
-            db.close()
-
-    def load_memory(self, query: str):
-        memory_data = self.memory.load_memory_variables({"input": query})
-        return memory_data
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(fallback)
+
+    async def drain(self):
+        await asyncio.gather(*(stream.task for stream in list(self._inflight.values())), return_exceptions=True)
+        await self.batcher.close()
+        await self.writer.close()
+        await self.memory.drain()
+
+    async def confirm_memory(self, question: str, decision: MemoryDecision, vector):
+        if decision.should_remember and decision.confirm:
+            # Persisted by the writer task, off the request path and batched with other saves
+            self.writer.put({
+                "question": question,
+                "response": decision.answer,
+                "long_term": True,
+                "embedding": vector.tobytes()
+            })
+
+    async def save_memory(self, question: str, response: str, long_term: bool):
+        memories = await self.save_memories_batch([{"question": question, "response": response, "long_term": long_term}])
+        return memories[0]
+
+    async def save_memories_batch(self, rows: list):
+        # One transaction, and so one fsync, for every row. RETURNING hands back the ids
+        # so nothing has to be read back.
+        async with AsyncSessionLocal() as db:
+            statement = insert(Memory).returning(Memory.id, sort_by_parameter_order=True)
+            ids = (await db.execute(statement, rows)).scalars().all()
+            await db.commit()
+        return [{"id": memory_id, **row} for memory_id, row in zip(ids, rows)]
+
+    async def load_memory(self, query: str):
+        history = await self.memory.load(await self.embed(query))
+        return {"history": history}
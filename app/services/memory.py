@@ -0,0 +1,116 @@
+# app/services/memory.py
+
+import asyncio
+import logging
+from typing import Callable
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import select, update
+
+from app.models.memory import Memory
+from app.utils.database import AsyncSessionLocal
+from app.utils.vector_index import HNSWIndex, normalize
+
+logger = logging.getLogger(__name__)
+
+class LongTermMemory:
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        count_tokens: Callable[[str], int],
+        k: int = 5,
+        max_entries: int = 20_000,
+        max_tokens: int = 512
+    ):
+        self.embeddings = embeddings
+        self.count_tokens = count_tokens
+        self.k = k
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        # Approximate nearest-neighbour search keeps lookups fast as the memory grows
+        self.index = HNSWIndex(max_entries=max_entries)
+        # Bumped whenever new memories are indexed, so answers cached before then can be dropped
+        self.version = 0
+        self._last_id = 0
+        self._refresh_lock = asyncio.Lock()
+
+    async def build(self):
+        await self.backfill()
+        await self.refresh()
+        await self.drain()
+
+    async def refresh(self):
+        # Every worker has its own index but they share the database, so memories saved
+        # by any worker are picked up here, served by the (long_term, id DESC) index
+        async with self._refresh_lock:
+            async with AsyncSessionLocal() as db:
+                query = (
+                    select(Memory.id, Memory.embedding)
+                    .where(Memory.long_term == True, Memory.id > self._last_id, Memory.embedding.is_not(None))
+                    .order_by(Memory.id.desc())
+                    .limit(self.max_entries)
+                )
+                rows = (await db.execute(query)).all()
+            if not rows:
+                return
+            self._last_id = rows[0][0]
+            # Oldest first, so once the index is full new memories evict the oldest ones
+            for memory_id, embedding in reversed(rows):
+                self.add(memory_id, embedding)
+            self.version += 1
+
+    async def backfill(self):
+        # Rows saved before embeddings were stored are embedded once and written back
+        async with AsyncSessionLocal() as db:
+            query = (
+                select(Memory.id, Memory.question)
+                .where(Memory.long_term == True, Memory.embedding.is_(None))
+                .order_by(Memory.id.desc())
+                .limit(self.max_entries)
+            )
+            missing = (await db.execute(query)).all()
+        if not missing:
+            return
+        try:
+            vectors = await self.embeddings.aembed_documents([question for _, question in missing])
+        except Exception:
+            logger.exception("Could not embed %d stored memories, retrying on next start", len(missing))
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Memory),
+                [{"id": memory_id, "embedding": normalize(vector).tobytes()} for (memory_id, _), vector in zip(missing, vectors)]
+            )
+            await db.commit()
+
+    def add(self, memory_id: int, embedding: bytes):
+        self.index.add(np.frombuffer(embedding, dtype=np.float32), memory_id)
+
+    async def drain(self):
+        await self.index.drain()
+
+    async def load(self, vector: np.ndarray) -> str:
+        await self.refresh()
+        ids = [memory_id for _, memory_id in await self.index.search(vector, self.k)]
+        if not ids:
+            return ""
+        async with AsyncSessionLocal() as db:
+            memories = (await db.execute(select(Memory).where(Memory.id.in_(ids)))).scalars().all()
+        by_id = {memory.id: f"Human: {memory.question}\nAI: {memory.response}" for memory in memories}
+
+        # The most similar memories fill the token budget first, so the prompt stays
+        # bounded however long the stored answers are. One that doesn't fit is skipped
+        # so smaller ones after it can still use the rest.
+        kept = []
+        budget = self.max_tokens
+        for memory_id in ids:
+            if memory_id not in by_id:
+                continue
+            tokens = self.count_tokens(by_id[memory_id])
+            if tokens > budget:
+                continue
+            budget -= tokens
+            kept.append(memory_id)
+        # Ordered by id rather than score so the same memories always render the same history
+        return "\n".join(by_id[memory_id] for memory_id in sorted(kept))
\ No newline at end of file
@@ -0,0 +1,40 @@
+# app/services/memory_writer.py
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MemoryWriter:
+    def __init__(self, save_batch, max_batch: int = 64):
+        self.save_batch = save_batch
+        self.max_batch = max_batch
+        self._queue = asyncio.Queue()
+        self._worker = None
+
+    def put(self, row: dict):
+        # Started lazily so the worker runs on the loop that serves requests
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        self._queue.put_nowait(row)
+
+    async def _run(self):
+        while True:
+            rows = [await self._queue.get()]
+            # Whatever queued up while the previous batch was committing goes in one transaction
+            while len(rows) < self.max_batch and not self._queue.empty():
+                rows.append(self._queue.get_nowait())
+            try:
+                await self.save_batch(rows)
+            except Exception:
+                logger.exception("Failed to save %d memories", len(rows))
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    async def close(self):
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        self._worker = None
\ No newline at end of file
@@ -0,0 +1,24 @@
+# app/services/semantic_cache.py
+
+from typing import Optional
+
+import numpy as np
+
+from app.utils.vector_index import VectorIndex
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.85, max_entries: int = 10_000):
+        self.threshold = threshold
+        self.index = VectorIndex(max_entries=max_entries)
+
+    async def lookup(self, vector: np.ndarray) -> Optional[str]:
+        for score, response in await self.index.search(vector):
+            if score >= self.threshold:
+                return response
+        return None
+
+    def add(self, vector: np.ndarray, response: str):
+        self.index.add(vector, response)
+
+    def clear(self):
+        self.index = VectorIndex(max_entries=self.index.max_entries)
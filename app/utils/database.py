@@ -1,9 +1,52 @@
 # app/utils/database.py
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+url = make_url(settings.DATABASE_URL)
+if url.drivername == "sqlite":
+    url = url.set(drivername="sqlite+aiosqlite")
+
+engine = create_async_engine(url)
+AsyncSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+Base = declarative_base()
+
+if url.get_backend_name() == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the writer and busy_timeout waits out
+        # lock contention instead of failing with SQLITE_BUSY
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+def upgrade_tables(connection):
+    # create_all skips tables that already exist, so columns and indexes added to the
+    # models since a database was created are added here
+    for table in Base.metadata.sorted_tables:
+        if connection.dialect.name == "sqlite":
+            existing = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=connection.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+async def create_tables(attempts: int = 3):
+    # Workers start together and race to create the schema, whoever loses finds it on retry
+    for attempt in range(attempts):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(upgrade_tables)
+            return
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
\ No newline at end of file
@@ -0,0 +1,145 @@
+# app/utils/vector_index.py
+
+import asyncio
+import logging
+from typing import Any, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def normalize(vector) -> np.ndarray:
+    # Unit vectors make the inner product a cosine similarity
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+class VectorIndex:
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries
+        self._vectors = None
+        self._payloads = []
+        self._next = 0
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def add(self, vector: np.ndarray, payload: Any):
+        if self._vectors is None:
+            self._vectors = np.zeros((self._capacity(64), vector.shape[0]), dtype=np.float32)
+        elif self._next >= len(self._vectors):
+            grown = np.zeros((self._capacity(2 * len(self._vectors)), vector.shape[0]), dtype=np.float32)
+            grown[:len(self._vectors)] = self._vectors
+            self._vectors = grown
+        # Once full, overwrite the oldest entry
+        self._vectors[self._next] = vector
+        if self._next < len(self._payloads):
+            self._payloads[self._next] = payload
+        else:
+            self._payloads.append(payload)
+        self._next += 1
+        if self.max_entries is not None and self._next == self.max_entries:
+            self._next = 0
+
+    async def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[float, Any]]:
+        if not self._payloads:
+            return []
+        # The scan runs in a thread, numpy releases the GIL so other requests keep being served
+        scores = await asyncio.to_thread(np.matmul, self._vectors[:len(self._payloads)], vector)
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        # Slots can be overwritten while the scan runs, so rescore against the current rows
+        results = [(float(self._vectors[i] @ vector), self._payloads[i]) for i in top]
+        return sorted(results, key=lambda result: result[0], reverse=True)
+
+    def _capacity(self, size: int) -> int:
+        return size if self.max_entries is None else min(size, self.max_entries)
+
+class HNSWIndex:
+    def __init__(self, max_entries: int, rebuild_every: int = 1024, neighbors: int = 32, ef_search: int = 64):
+        self.max_entries = max_entries
+        self.rebuild_every = rebuild_every
+        self.neighbors = neighbors
+        self.ef_search = ef_search
+        # The graph is never modified once built, so searches can run in threads while a
+        # replacement is built. New vectors wait in a small exact-search buffer meanwhile.
+        self._index = None
+        self._payloads = []
+        self._recent_vectors = []
+        self._recent_payloads = []
+        self._recent_matrix = None
+        self._rebuilding = None
+
+    def __len__(self):
+        return len(self._payloads) + len(self._recent_payloads)
+
+    def add(self, vector: np.ndarray, payload: Any):
+        self._recent_vectors.append(vector)
+        self._recent_payloads.append(payload)
+        self._recent_matrix = None
+        full = len(self) > self.max_entries
+        if (full or len(self._recent_payloads) >= self.rebuild_every) and self._rebuilding is None:
+            self._rebuilding = asyncio.create_task(self._rebuild())
+
+    async def search(self, vector: np.ndarray, k: int = 1) -> List[Tuple[float, Any]]:
+        index, payloads = self._index, self._payloads
+        results = []
+        if self._recent_payloads:
+            if self._recent_matrix is None:
+                self._recent_matrix = np.stack(self._recent_vectors)
+            scores = self._recent_matrix @ vector
+            results += [(float(score), payload) for score, payload in zip(scores, self._recent_payloads)]
+        if index is not None:
+            scores, positions = await asyncio.to_thread(index.search, vector[None, :], k)
+            results += [(float(score), payloads[position]) for score, position in zip(scores[0], positions[0]) if position >= 0]
+        return sorted(results, key=lambda result: result[0], reverse=True)[:k]
+
+    async def drain(self):
+        while self._rebuilding is not None:
+            await asyncio.shield(self._rebuilding)
+
+    async def _rebuild(self):
+        try:
+            index, payloads = self._index, self._payloads
+            recent_vectors, recent_payloads = list(self._recent_vectors), list(self._recent_payloads)
+            try:
+                self._index, self._payloads = await asyncio.to_thread(
+                    self._build, index, payloads, recent_vectors, recent_payloads
+                )
+            except Exception:
+                # Dropped rather than kept for the next rebuild, which would fail the same way
+                # on every add while the buffer grows
+                logger.exception("Could not rebuild the vector index, dropping %d new vectors", len(recent_payloads))
+            del self._recent_vectors[:len(recent_vectors)]
+            del self._recent_payloads[:len(recent_payloads)]
+            self._recent_matrix = None
+        finally:
+            self._rebuilding = None
+        # Vectors added during the rebuild may already call for the next one
+        if len(self) > self.max_entries or len(self._recent_payloads) >= self.rebuild_every:
+            self._rebuilding = asyncio.create_task(self._rebuild())
+
+    def _build(self, index, payloads, recent_vectors, recent_payloads):
+        # Vectors from an earlier embedding model can't share a graph with the current one
+        dimension = recent_vectors[-1].shape[0]
+        vectors = [vector for vector in recent_vectors if vector.shape[0] == dimension]
+        recent_payloads = [payload for vector, payload in zip(recent_vectors, recent_payloads) if vector.shape[0] == dimension]
+        if len(vectors) < len(recent_vectors):
+            logger.warning("Dropping %d vectors without %d dimensions", len(recent_vectors) - len(vectors), dimension)
+        vectors = np.stack(vectors)
+        if index is not None and index.d == dimension:
+            vectors = np.vstack([index.reconstruct_n(0, index.ntotal), vectors])
+        elif index is not None:
+            logger.warning("Dropping %d indexed vectors without %d dimensions", index.ntotal, dimension)
+            payloads = []
+        payloads = payloads + recent_payloads
+        # Evict the oldest tenth at once so a full index isn't rebuilt for every new vector
+        keep = len(payloads)
+        if keep > self.max_entries:
+            keep = self.max_entries - self.max_entries // 10
+        graph = faiss.IndexHNSWFlat(dimension, self.neighbors, faiss.METRIC_INNER_PRODUCT)
+        graph.hnsw.efSearch = self.ef_search
+        graph.add(vectors[-keep:])
+        return graph, payloads[-keep:]
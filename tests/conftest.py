@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Tests get their own database instead of the app's, the database fixture resets it
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
\ No newline at end of file
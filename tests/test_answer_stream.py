@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from app.services.answer_stream import AnswerStream
+
+async def source():
+    for chunk in ["The capital ", "of France ", "is Paris."]:
+        await asyncio.sleep(0)
+        yield chunk
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+@pytest.mark.asyncio
+async def test_every_reader_gets_every_chunk():
+    stream = AnswerStream(source())
+    first = await collect(stream)
+    second = await collect(stream)
+    assert first == second == ["The capital ", "of France ", "is Paris."]
+
+@pytest.mark.asyncio
+async def test_concurrent_readers():
+    stream = AnswerStream(source())
+    results = await asyncio.gather(collect(stream), collect(stream))
+    assert results == [["The capital ", "of France ", "is Paris."]] * 2
+
+@pytest.mark.asyncio
+async def test_errors_reach_readers():
+    async def failing():
+        yield "The capital "
+        raise Exception("connection reset")
+    stream = AnswerStream(failing())
+    with pytest.raises(Exception, match="connection reset"):
+        await collect(stream)
@@ -0,0 +1,29 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.embedding_batcher import EmbeddingBatcher
+
+@pytest.mark.asyncio
+async def test_embed_batches_concurrent_texts():
+    embeddings = MagicMock(aembed_documents=AsyncMock(side_effect=lambda texts: [[len(text)] for text in texts]))
+    batcher = EmbeddingBatcher(embeddings, max_batch=64, max_wait=0.01)
+    vectors = await asyncio.gather(batcher.embed("a"), batcher.embed("bb"), batcher.embed("ccc"))
+    await batcher.close()
+    assert vectors == [[1], [2], [3]]
+    embeddings.aembed_documents.assert_awaited_once_with(["a", "bb", "ccc"])
+
+@pytest.mark.asyncio
+async def test_embed_respects_max_batch():
+    embeddings = MagicMock(aembed_documents=AsyncMock(side_effect=lambda texts: [[len(text)] for text in texts]))
+    batcher = EmbeddingBatcher(embeddings, max_batch=2, max_wait=0.01)
+    await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "ccc"]))
+    await batcher.close()
+    assert embeddings.aembed_documents.await_count == 2
+
+@pytest.mark.asyncio
+async def test_embed_propagates_errors():
+    embeddings = MagicMock(aembed_documents=AsyncMock(side_effect=Exception("rate limited")))
+    batcher = EmbeddingBatcher(embeddings)
+    with pytest.raises(Exception, match="rate limited"):
+        await batcher.embed("a")
+    await batcher.close()
@@ -0,0 +1,17 @@
+from app.services.exact_cache import ExactCache
+
+def test_evicts_least_recently_used():
+    exact_cache = ExactCache(max_entries=2)
+    exact_cache.put("first", "1")
+    exact_cache.put("second", "2")
+    assert exact_cache.get("first") == "1"
+    exact_cache.put("third", "3")
+    assert exact_cache.get("second") is None
+    assert exact_cache.get("first") == "1"
+    assert exact_cache.get("third") == "3"
+
+def test_clear():
+    exact_cache = ExactCache(max_entries=2)
+    exact_cache.put("first", "1")
+    exact_cache.clear()
+    assert exact_cache.get("first") is None
@@ -0,0 +1,17 @@
+import pytest
+from app.api.endpoints.langchain import event_stream
+
+@pytest.mark.asyncio
+async def test_event_stream_frames_chunks():
+    async def chunks():
+        yield "Hello"
+        yield "\nworld"
+    assert [frame async for frame in event_stream(chunks())] == ["data: Hello\n\n", "data: \ndata: world\n\n"]
+
+@pytest.mark.asyncio
+async def test_event_stream_reports_errors():
+    async def chunks():
+        yield "Hello"
+        raise RuntimeError("boom")
+    frames = [frame async for frame in event_stream(chunks())]
+    assert frames == ["data: Hello\n\n", "event: error\ndata: Failed to generate an answer\n\n"]
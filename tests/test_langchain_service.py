@@ -1,43 +1,257 @@
+import asyncio
+import httpx
 import pytest
-from unittest.mock import MagicMock
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock
+from langchain_core.embeddings import DeterministicFakeEmbedding
 from app.services.langchain_service import LangChainService
+from app.services.memory import LongTermMemory
+from app.schemas.memory import MemoryDecision
 from app.core.config import settings
+from sqlalchemy import select
+from app.models.memory import Memory
+from app.utils.database import AsyncSessionLocal, Base, create_tables, engine
+from app.utils.vector_index import normalize
 
 @pytest.fixture
 def langchain_service(monkeypatch):
     monkeypatch.setenv("OPENAI_API_KEY", settings.OPENAI_API_KEY)
     return LangChainService()
 
-def test_ask_question(langchain_service):
+@pytest.fixture
+def offline_service(langchain_service):
+    # Fake embeddings and a word count stand in for the OpenAI and tiktoken calls
+    langchain_service.batcher.embeddings = langchain_service.memory.embeddings = DeterministicFakeEmbedding(size=256)
+    langchain_service.memory.count_tokens = lambda text: len(text.split())
+    return langchain_service
+
+async def fake_embed(text):
+    return normalize(await DeterministicFakeEmbedding(size=256).aembed_query(text))
+
+@pytest_asyncio.fixture
+async def database():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_ask_question(langchain_service, database):
     question = "What is the capital of France?"
-    response = langchain_service.ask_question(question)
+    response = await langchain_service.ask_question(question)
     assert isinstance(response, str)
 
-def test_analyze_response(langchain_service):
+@pytest.mark.asyncio
+async def test_ask_question_coalesces_identical_questions(langchain_service, database, monkeypatch):
+    calls = []
+    async def answer(question, key):
+        calls.append(question)
+        await asyncio.sleep(0.01)
+        yield "The capital of France "
+        yield "is Paris."
+    monkeypatch.setattr(langchain_service, "_answer", answer)
+    responses = await asyncio.gather(
+        langchain_service.ask_question("What is the capital of France?"),
+        langchain_service.ask_question("  what is the capital of france?"),
+    )
+    assert responses == ["The capital of France is Paris."] * 2
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_confirm_memory(langchain_service, monkeypatch):
     question = "What is the capital of France?"
-    response = "The capital of France is Paris."
-    analysis = langchain_service.analyze_response(question, response)
-    assert isinstance(analysis, str)
+    decision = MemoryDecision(answer="The capital of France is Paris.", should_remember=True, confirm=True)
+    mock_writer = MagicMock()
+    monkeypatch.setattr(langchain_service, "writer", mock_writer)
+    vector = await fake_embed(question)
+    await langchain_service.confirm_memory(question, decision, vector)
+    mock_writer.put.assert_called_with({
+        "question": question,
+        "response": decision.answer,
+        "long_term": True,
+        "embedding": vector.tobytes()
+    })
 
-def test_confirm_memory(langchain_service, monkeypatch):
-    analysis = "Positive"
+@pytest.mark.asyncio
+async def test_confirm_memory_rejected(langchain_service, monkeypatch):
     question = "What is the capital of France?"
-    response = "The capital of France is Paris."
-    mock_save_memory = MagicMock()
-    monkeypatch.setattr(langchain_service, "save_memory", mock_save_memory)
-    langchain_service.confirm_memory(analysis, question, response)
-    mock_save_memory.assert_called_with(question, response, long_term=True)
+    decision = MemoryDecision(answer="The capital of France is Paris.", should_remember=True, confirm=False)
+    mock_writer = MagicMock()
+    monkeypatch.setattr(langchain_service, "writer", mock_writer)
+    await langchain_service.confirm_memory(question, decision, await fake_embed(question))
+    mock_writer.put.assert_not_called()
 
-def test_save_memory(langchain_service):
+@pytest.mark.asyncio
+async def test_save_memory(langchain_service, database):
     question = "What is the capital of France?"
     response = "The capital of France is Paris."
-    memory = langchain_service.save_memory(question, response, long_term=True)
-    assert memory.id is not None
-    assert memory.question == question
-    assert memory.response == response
-    assert memory.long_term
+    memory = await langchain_service.save_memory(question, response, long_term=True)
+    assert memory["id"] is not None
+    assert memory["question"] == question
+    assert memory["response"] == response
+    assert memory["long_term"]
+
+@pytest.mark.asyncio
+async def test_save_memories_batch(langchain_service, database):
+    rows = [
+        {"question": "What is the capital of France?", "response": "Paris.", "long_term": True},
+        {"question": "What is the capital of Spain?", "response": "Madrid.", "long_term": True},
+    ]
+    memories = await langchain_service.save_memories_batch(rows)
+    assert [memory["question"] for memory in memories] == [row["question"] for row in rows]
+    assert all(memory["id"] is not None for memory in memories)
 
-def test_load_memory(langchain_service):
+@pytest.mark.asyncio
+async def test_load_memory(langchain_service):
     query = "What is the capital of France?"
-    memory_data = langchain_service.load_memory(query)
+    memory_data = await langchain_service.load_memory(query)
     assert isinstance(memory_data, dict)
+
+@pytest.mark.asyncio
+async def test_ask_question_remembers_confirmed_memory(offline_service, database):
+    question = "What is the capital of France?"
+    decision = MemoryDecision(answer="The capital of France is Paris.", should_remember=True, confirm=True)
+    async def astream(inputs):
+        yield {"answer": "The capital of France"}
+        yield {"answer": "The capital of France is Paris."}
+        yield decision.model_dump()
+    offline_service.agent = MagicMock(astream=astream)
+    chunks = [chunk async for chunk in offline_service.stream_question(question)]
+    assert chunks == ["The capital of France", " is Paris."]
+    await offline_service.drain()
+    memory_data = await offline_service.load_memory(question)
+    assert memory_data == {"history": f"Human: {question}\nAI: {decision.answer}"}
+
+@pytest.mark.asyncio
+async def test_start_indexes_recent_long_term_memories(langchain_service, database):
+    memory = LongTermMemory(DeterministicFakeEmbedding(size=256), lambda text: len(text.split()), max_entries=2)
+    questions = ["What is the capital of France?", "What is the capital of Spain?", "What is the capital of Italy?"]
+    rows = [
+        {"question": question, "response": "A city.", "long_term": True, "embedding": (await fake_embed(question)).tobytes()}
+        for question in questions
+    ]
+    memories = await langchain_service.save_memories_batch(rows[:2])
+    await memory.build()
+    indexed = [memory_id for _, memory_id in await memory.index.search(await fake_embed(questions[0]), k=10)]
+    assert set(indexed) == {memories[0]["id"], memories[1]["id"]}
+    memories += await langchain_service.save_memories_batch(rows[2:])
+    await memory.refresh()
+    await memory.drain()
+    indexed = [memory_id for _, memory_id in await memory.index.search(await fake_embed(questions[0]), k=10)]
+    assert set(indexed) == {memories[1]["id"], memories[2]["id"]}
+
+@pytest.mark.asyncio
+async def test_load_memory_respects_token_budget(offline_service, database):
+    offline_service.memory.max_tokens = 20
+    question = "What is the capital of France?"
+    # The oversized memory is the closest match, the one that fits still makes it in
+    rows = [
+        {"question": "Tell me about France.", "response": "France " * 50, "long_term": True, "embedding": (await fake_embed(question)).tobytes()},
+        {"question": question, "response": "Paris.", "long_term": True, "embedding": (await fake_embed("Paris")).tobytes()},
+    ]
+    await offline_service.save_memories_batch(rows)
+    memory_data = await offline_service.load_memory(question)
+    assert memory_data == {"history": f"Human: {question}\nAI: Paris."}
+
+@pytest.mark.asyncio
+async def test_ask_question_exact_repeat_skips_embedding(offline_service, database, monkeypatch):
+    decision = MemoryDecision(answer="The capital of France is Paris.", should_remember=False, confirm=False)
+    async def astream(inputs):
+        yield decision.model_dump()
+    offline_service.agent = MagicMock(astream=astream)
+    assert await offline_service.ask_question("What is the capital of France?") == decision.answer
+    mock_embed = AsyncMock()
+    monkeypatch.setattr(offline_service, "embed", mock_embed)
+    assert await offline_service.ask_question("  what is the capital of france?") == decision.answer
+    mock_embed.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_openai_clients_use_http_timeout():
+    async with httpx.AsyncClient() as http_client:
+        langchain_service = LangChainService(http_client=http_client)
+        assert langchain_service.llm.request_timeout == settings.HTTP_TIMEOUT
+        assert langchain_service.embeddings.request_timeout == settings.HTTP_TIMEOUT
+
+@pytest.mark.asyncio
+async def test_start_backfills_missing_embeddings(offline_service, database):
+    question = "What is the capital of France?"
+    memory = await offline_service.save_memory(question, "Paris.", long_term=True)
+    await offline_service.memory.build()
+    async with AsyncSessionLocal() as db:
+        embedding = (await db.execute(select(Memory.embedding).where(Memory.id == memory["id"]))).scalar_one()
+    assert embedding == (await fake_embed(question)).tobytes()
+    indexed = [memory_id for _, memory_id in await offline_service.memory.index.search(await fake_embed(question))]
+    assert indexed == [memory["id"]]
+
+@pytest.mark.asyncio
+async def test_create_tables_upgrades_existing_database(database):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.exec_driver_sql(
+            "CREATE TABLE memories (id INTEGER PRIMARY KEY, question VARCHAR, response TEXT, long_term BOOLEAN)"
+        )
+    await create_tables()
+    async with engine.begin() as conn:
+        columns = {row[1] for row in await conn.exec_driver_sql("PRAGMA table_info(memories)")}
+        indexes = {row[1] for row in await conn.exec_driver_sql("PRAGMA index_list(memories)")}
+    assert "embedding" in columns
+    assert "ix_memories_long_term_id" in indexes
+
+@pytest.mark.asyncio
+async def test_load_memory_sees_memories_saved_by_other_workers(offline_service, database):
+    await offline_service.memory.build()
+    other_worker = LangChainService()
+    question = "What is the capital of France?"
+    await other_worker.save_memories_batch([
+        {"question": question, "response": "Paris.", "long_term": True, "embedding": (await fake_embed(question)).tobytes()}
+    ])
+    memory_data = await offline_service.load_memory(question)
+    assert memory_data == {"history": f"Human: {question}\nAI: Paris."}
+
+@pytest.mark.asyncio
+async def test_ask_question_does_not_cache_incomplete_decision(offline_service, database):
+    streams = iter([
+        [{"answer": "The capital of France is Paris.", "should_remember": True}],
+        # Ends mid-escape, which parses to an empty dict
+        [{"answer": "Paris"}, {}],
+        [{"answer": "Paris.", "should_remember": False, "confirm": False}],
+    ])
+    async def astream(inputs):
+        for arguments in next(streams):
+            yield arguments
+    offline_service.agent = MagicMock(astream=astream)
+    question = "What is the capital of France?"
+    assert await offline_service.ask_question(question) == "The capital of France is Paris."
+    assert await offline_service.ask_question(question) == "Paris"
+    assert await offline_service.ask_question(question) == "Paris."
+    await offline_service.drain()
+    async with AsyncSessionLocal() as db:
+        assert (await db.execute(select(Memory))).scalars().all() == []
+
+@pytest.mark.asyncio
+async def test_start_loads_token_encodings_once(langchain_service, monkeypatch):
+    encoding = MagicMock()
+    encoding.encode.return_value = [1, 2, 3]
+    encoding_for_model = MagicMock(return_value=encoding)
+    monkeypatch.setattr("tiktoken.encoding_for_model", encoding_for_model)
+    monkeypatch.setattr(langchain_service.memory, "build", AsyncMock())
+    await langchain_service.start()
+    assert langchain_service.memory.count_tokens("Human: Hi\nAI: Hello") == 3
+    assert langchain_service.memory.count_tokens("Human: Bye\nAI: Goodbye") == 3
+    assert sorted(args for args, _ in encoding_for_model.call_args_list) == sorted([(settings.OPENAI_MODEL,), (settings.EMBEDDING_MODEL,)])
+
+@pytest.mark.asyncio
+async def test_new_memory_invalidates_cached_answers(offline_service, database):
+    question = "What is my favourite colour?"
+    answers = iter(["I don't know.", "Your favourite colour is blue."])
+    async def astream(inputs):
+        yield {"answer": next(answers), "should_remember": False, "confirm": False}
+    offline_service.agent = MagicMock(astream=astream)
+    assert await offline_service.ask_question(question) == "I don't know."
+    assert await offline_service.ask_question(question) == "I don't know."
+    statement = "My favourite colour is blue."
+    await offline_service.save_memories_batch([
+        {"question": statement, "response": "Noted.", "long_term": True, "embedding": (await fake_embed(statement)).tobytes()}
+    ])
+    assert await offline_service.ask_question(question) == "Your favourite colour is blue."
@@ -0,0 +1,22 @@
+import pytest
+from unittest.mock import AsyncMock
+from app.services.memory_writer import MemoryWriter
+
+@pytest.mark.asyncio
+async def test_put_batches_rows():
+    save_batch = AsyncMock()
+    writer = MemoryWriter(save_batch, max_batch=2)
+    rows = [{"question": f"q{i}", "response": f"r{i}", "long_term": True} for i in range(3)]
+    for row in rows:
+        writer.put(row)
+    await writer.close()
+    assert [call.args[0] for call in save_batch.await_args_list] == [rows[:2], rows[2:]]
+
+@pytest.mark.asyncio
+async def test_failed_batch_does_not_stop_writer():
+    save_batch = AsyncMock(side_effect=[Exception("database is locked"), None])
+    writer = MemoryWriter(save_batch, max_batch=1)
+    writer.put({"question": "q1", "response": "r1", "long_term": True})
+    writer.put({"question": "q2", "response": "r2", "long_term": True})
+    await writer.close()
+    assert save_batch.await_count == 2
@@ -0,0 +1,33 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.services.semantic_cache import SemanticCache
+from app.utils.vector_index import normalize
+
+embeddings = DeterministicFakeEmbedding(size=256)
+
+def embed(text):
+    return normalize(embeddings.embed_query(text))
+
+@pytest.fixture
+def semantic_cache():
+    return SemanticCache(threshold=0.85, max_entries=2)
+
+@pytest.mark.asyncio
+async def test_lookup_hit(semantic_cache):
+    question = "What is the capital of France?"
+    assert await semantic_cache.lookup(embed(question)) is None
+    semantic_cache.add(embed(question), "The capital of France is Paris.")
+    assert await semantic_cache.lookup(embed(question)) == "The capital of France is Paris."
+
+@pytest.mark.asyncio
+async def test_lookup_miss(semantic_cache):
+    semantic_cache.add(embed("What is the capital of France?"), "The capital of France is Paris.")
+    assert await semantic_cache.lookup(embed("How tall is Mount Everest?")) is None
+
+@pytest.mark.asyncio
+async def test_evicts_oldest(semantic_cache):
+    for question in ["first", "second", "third"]:
+        semantic_cache.add(embed(question), question)
+    assert await semantic_cache.lookup(embed("first")) is None
+    assert await semantic_cache.lookup(embed("second")) == "second"
+    assert await semantic_cache.lookup(embed("third")) == "third"
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.utils.vector_index import HNSWIndex, normalize
+
+embeddings = DeterministicFakeEmbedding(size=64)
+
+def embed(text):
+    return normalize(embeddings.embed_query(text))
+
+@pytest.mark.asyncio
+async def test_search_before_and_after_rebuild():
+    index = HNSWIndex(max_entries=100, rebuild_every=4)
+    for i in range(3):
+        index.add(embed(f"memory {i}"), i)
+    assert (await index.search(embed("memory 1")))[0][1] == 1
+    index.add(embed("memory 3"), 3)
+    await index.drain()
+    assert index._index is not None
+    assert [payload for _, payload in await index.search(embed("memory 3"))] == [3]
+    assert len(index) == 4
+
+@pytest.mark.asyncio
+async def test_evicts_oldest_when_full():
+    index = HNSWIndex(max_entries=2)
+    for i in range(3):
+        index.add(embed(f"memory {i}"), i)
+    await index.drain()
+    assert len(index) == 2
+    assert {payload for _, payload in await index.search(embed("memory 0"), k=10)} == {1, 2}
+
+@pytest.mark.asyncio
+async def test_rebuild_drops_vectors_of_another_dimension():
+    index = HNSWIndex(max_entries=100, rebuild_every=3)
+    index.add(normalize(np.ones(32)), "old")
+    index.add(embed("memory 0"), 0)
+    index.add(embed("memory 1"), 1)
+    await index.drain()
+    assert len(index) == 2
+    assert [payload for _, payload in await index.search(embed("memory 1"))] == [1]
+
+@pytest.mark.asyncio
+async def test_failed_rebuild_is_logged_and_dropped(monkeypatch, caplog):
+    index = HNSWIndex(max_entries=100, rebuild_every=2)
+    def build(*args):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(index, "_build", build)
+    index.add(embed("memory 0"), 0)
+    index.add(embed("memory 1"), 1)
+    await index.drain()
+    assert "Could not rebuild the vector index" in caplog.text
+    assert len(index) == 0
+    assert index._rebuilding is None